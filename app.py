@@ -1,26 +1,147 @@
 import streamlit as st
 import pandas as pd
-from io import StringIO
-import time
+import numpy as np
+import csv
+from io import StringIO, BytesIO
 
-# Conversion constants
-MARLA_PER_SARSHAI = 9
-KANAL_PER_MARLA = 20
-KILA_PER_KANAL = 8
+from units import (
+    MARLA_PER_SARSHAI, KANAL_PER_MARLA, KILA_PER_KANAL,
+    SARSHAI_PER_KANAL, SARSHAI_PER_MARLA, kanal_marla_to_sarshai,
+)
+
+# Columns loaded from uploaded CSVs; anything else in the export is skipped
+DISPLAY_COLUMNS = ['Khewat', 'Khatoni', 'Khasra', 'Type of Land', 'Source of Irrigation', 'Kanal', 'Marla']
+
+# Columns an upload cannot be processed without
+REQUIRED_COLUMNS = ['Kanal', 'Marla']
+
+# Short header spellings accepted and renamed to their display column
+COLUMN_ALIASES = {'Type_Land': 'Type of Land', 'Irrigation': 'Source of Irrigation'}
+
+# Uploads larger than this are streamed in chunks and only a preview is kept
+LARGE_UPLOAD_BYTES = 50 * 1024 * 1024
+UPLOAD_CHUNK_ROWS = 100_000
+PREVIEW_ROWS = 10_000
+
+# Highly repetitive label columns stored as category codes instead of per-row strings
+CATEGORY_COLUMNS = ['Type of Land', 'Source of Irrigation', 'Khewat', 'Khatoni']
+
+# Rows per chunk when writing the CSV export
+CSV_CHUNK_ROWS = 10_000
+
+# Static UI text shown in the sidebar and as the default paste input
+INSTRUCTIONS_MD = """
+1. **Paste data** from Jamabandi.nic.in or **upload CSV**
+2. Ensure columns include **Kanal** and **Marla**
+3. Click **Process Data**
+4. View **Raw Totals** and **Converted Totals**
+"""
+
+EXPECTED_FORMAT = """Khewat  Khatoni  Khasra    Type of Land  Source of Irrigation  Kanal  Marla
+594     846      0//303    प्लाट                                 0      19
+594     846      0//492    गढडे                                 0      3"""
+
+SAMPLE_DATA = """Khewat\tKhatoni\tKhasra\tType of Land\tSource of Irrigation\tKanal\tMarla
+594\t846\t0//303\tप्लाट\t\t0\t19
+594\t846\t0//492\tगढडे\t\t0\t3"""
+
+@st.cache_data
+def parse_pasted_data(pasted_data):
+    """Parse pasted table text, cached per unique input"""
+    # Sniff the delimiter once so parsing stays on the fast C engine; default to tabs
+    try:
+        sep = csv.Sniffer().sniff(pasted_data[:4096], delimiters='\t,;|').delimiter
+    except csv.Error:
+        sep = '\t'
+    df = pd.read_csv(StringIO(pasted_data), sep=sep, engine='c', encoding='utf-8')
+    return df.rename(columns=COLUMN_ALIASES)
+
+def upload_usecols(file_bytes):
+    """Display columns present in an uploaded CSV, read from its header line"""
+    # Resolve usecols up front: the pyarrow engine takes only a list of names
+    # and rejects names missing from the file. Slice to the first newline rather than
+    # splitting, which would copy the whole upload
+    end = file_bytes.find(b'\n')
+    header_line = (file_bytes if end == -1 else file_bytes[:end]).decode('utf-8-sig')
+    header = next(csv.reader(StringIO(header_line)), [])
+    usecols = [c for c in header if COLUMN_ALIASES.get(c, c) in DISPLAY_COLUMNS]
+    # An empty list would make the pyarrow engine load every column
+    if not usecols:
+        raise ValueError("no Jamabandi columns found in the file header")
+    return usecols
+
+def missing_upload_columns(file_bytes):
+    """Display columns absent from an uploaded CSV's header, under either spelling"""
+    found = {COLUMN_ALIASES.get(c, c) for c in upload_usecols(file_bytes)}
+    return [c for c in DISPLAY_COLUMNS if c not in found]
+
+@st.cache_data
+def parse_uploaded_file(file_bytes):
+    """Parse uploaded CSV bytes, cached per unique file content"""
+    usecols = upload_usecols(file_bytes)
+    try:
+        # Arrow's multithreaded reader; columns stay NumPy-backed so process_data's
+        # coercion turns non-numeric Kanal/Marla cells into 0
+        df = pd.read_csv(BytesIO(file_bytes), usecols=usecols, engine='pyarrow')
+    except ImportError:  # pyarrow not installed
+        df = pd.read_csv(BytesIO(file_bytes), usecols=usecols, encoding='utf-8')
+    return df.rename(columns=COLUMN_ALIASES)
+
+@st.cache_data
+def read_large_upload(file_bytes, include_sarshai=False):
+    """Stream a large uploaded CSV in chunks, returning a preview, raw Kanal & Marla totals and the full CSV export"""
+    # The pyarrow engine has no chunksize support, so large files go through the C engine
+    total_kanal = total_marla = 0
+    previews = []
+    preview_rows = 0
+    output = BytesIO()
+    chunks = pd.read_csv(BytesIO(file_bytes), usecols=upload_usecols(file_bytes),
+                         chunksize=UPLOAD_CHUNK_ROWS, encoding='utf-8')
+    for i, chunk in enumerate(chunks):
+        chunk = chunk.rename(columns=COLUMN_ALIASES)
+        if preview_rows < PREVIEW_ROWS:
+            previews.append(chunk.head(PREVIEW_ROWS - preview_rows))
+            preview_rows += len(previews[-1])
+        chunk = process_data(chunk, include_sarshai)
+        total_kanal += int(chunk['Kanal'].sum())
+        total_marla += int(chunk['Marla'].sum())
+        chunk.to_csv(output, index=False, header=(i == 0), encoding='utf-8', chunksize=CSV_CHUNK_ROWS)
+    return pd.concat(previews, ignore_index=True), (total_kanal, total_marla), output.getvalue()
+
+def process_data(df, include_sarshai=False):
+    """Coerce Kanal & Marla, optionally adding a per-row Total_Sarshai column"""
+    # Kanal/Marla are whole-number counts stored as int32 (each value < 2**31); a
+    # fractional cell is truncated toward zero (1.5 -> 1). The Sarshai kernels widen
+    # to int64 before multiplying, so Total_Sarshai cannot overflow
+    df['Kanal'] = pd.to_numeric(df['Kanal'], errors='coerce').fillna(0).astype(np.int32)
+    df['Marla'] = pd.to_numeric(df['Marla'], errors='coerce').fillna(0).astype(np.int32)
+    for col in CATEGORY_COLUMNS:
+        # All-empty columns (common for Source of Irrigation) are left as-is
+        if col in df.columns and df[col].notna().any():
+            df[col] = df[col].astype('category')
+    if include_sarshai:
+        df['Total_Sarshai'] = kanal_marla_to_sarshai(df['Kanal'].to_numpy(), df['Marla'].to_numpy())
+    return df
+
+# Hash whole frames (plus column names and dtypes) for cache keys; Streamlit's
+# default samples frames of 100k+ rows
+@st.cache_data(hash_funcs={pd.DataFrame: lambda d: (
+    tuple(d.columns), tuple(map(str, d.dtypes)), int(pd.util.hash_pandas_object(d).sum()))})
+def create_csv_file(df):
+    """Encode the processed table as UTF-8 CSV bytes, written in chunks"""
+    output = BytesIO()
+    df.to_csv(output, index=False, encoding='utf-8', chunksize=CSV_CHUNK_ROWS)
+    return output.getvalue()
 
 def convert_totals(total_kanal, total_marla):
     """Convert total Kanal & Marla to Kila, Kanal, Marla, Sarshai"""
     # Convert everything to Sarshai only once
-    total_sarshai = (total_kanal * KANAL_PER_MARLA * MARLA_PER_SARSHAI) + (total_marla * MARLA_PER_SARSHAI)
+    total_sarshai = (total_kanal * SARSHAI_PER_KANAL) + (total_marla * SARSHAI_PER_MARLA)
     
-    kila = total_sarshai // (KILA_PER_KANAL * KANAL_PER_MARLA * MARLA_PER_SARSHAI)
-    remainder = total_sarshai % (KILA_PER_KANAL * KANAL_PER_MARLA * MARLA_PER_SARSHAI)
-    
-    kanal = remainder // (KANAL_PER_MARLA * MARLA_PER_SARSHAI)
-    remainder %= (KANAL_PER_MARLA * MARLA_PER_SARSHAI)
-    
-    marla = remainder // MARLA_PER_SARSHAI
-    sarshai = remainder % MARLA_PER_SARSHAI
+    # Peel units off smallest-first so every divisor stays a small constant
+    whole_marla, sarshai = divmod(total_sarshai, MARLA_PER_SARSHAI)
+    whole_kanal, marla = divmod(whole_marla, KANAL_PER_MARLA)
+    kila, kanal = divmod(whole_kanal, KILA_PER_KANAL)
     
     return kila, kanal, marla, sarshai
 
@@ -32,34 +153,26 @@ def main():
     # Sidebar instructions
     with st.sidebar:
         st.header("ℹ️ Instructions")
-        st.markdown("""
-        1. **Paste data** from Jamabandi.nic.in or **upload CSV**
-        2. Ensure columns include **Kanal** and **Marla**
-        3. Click **Process Data**
-        4. View **Raw Totals** and **Converted Totals**
-        """)
+        st.markdown(INSTRUCTIONS_MD)
         
         st.header("📊 Expected Format")
-        st.code("""Khewat  Khatoni  Khasra    Type_Land  Irrigation  Kanal  Marla
-594    846      0//303    प्लाट                0       19
-594    846      0//492    गढडे                0       3""")
+        st.code(EXPECTED_FORMAT)
 
     # Input method
     input_method = st.radio("Choose input method:", ["Paste Table Data", "Upload CSV File"], horizontal=True)
+    include_sarshai = st.checkbox("Include per-row Sarshai column", value=False)
     df = None
+    raw_totals = None
+    csv_data = None
 
     if input_method == "Paste Table Data":
         st.subheader("📋 Paste Data")
-        sample_data = """Khewat\tKhatoni\tKhasra\tType of Land\tSource of Irrigation\tKanal\tMarla
-594\t846\t0//303\tप्लाट\t\t0\t19
-594\t846\t0//492\tगढडे\t\t0\t3"""
-        
-        pasted_data = st.text_area("Paste your Jamabandi data here:", height=200, value=sample_data)
+        pasted_data = st.text_area("Paste your Jamabandi data here:", height=200, value=SAMPLE_DATA)
         
         if st.button("Process Data", type="primary", key="process_paste"):
             if pasted_data:
                 try:
-                    df = pd.read_csv(StringIO(pasted_data), sep='\t', encoding='utf-8')
+                    df = parse_pasted_data(pasted_data)
                     st.success("✅ Data parsed successfully!")
                 except Exception as e:
                     st.error(f"❌ Error parsing data: {e}")
@@ -72,17 +185,33 @@ def main():
         
         if uploaded_file and st.button("Process Data", type="primary", key="process_upload"):
             try:
-                df = pd.read_csv(uploaded_file, encoding='utf-8')
-                st.success("✅ File uploaded and parsed successfully!")
+                file_bytes = uploaded_file.getvalue()
+                missing = missing_upload_columns(file_bytes)
+                missing_required = [c for c in REQUIRED_COLUMNS if c in missing]
+                if missing_required:
+                    st.error(f"❌ Required columns missing: {', '.join(missing_required)}")
+                else:
+                    if missing:
+                        st.warning(f"⚠️ Missing expected columns: {', '.join(missing)}")
+                    if len(file_bytes) > LARGE_UPLOAD_BYTES:
+                        df, raw_totals, csv_data = read_large_upload(file_bytes, include_sarshai)
+                        st.info(f"ℹ️ Large file: showing the first {len(df):,} rows; totals and the CSV download cover the whole file.")
+                    else:
+                        df = parse_uploaded_file(file_bytes)
+                    st.success("✅ File uploaded and parsed successfully!")
             except Exception as e:
                 st.error(f"❌ Error reading file: {e}")
 
     if df is not None:
         with st.spinner("Processing data..."):
-            time.sleep(1)
-            # Raw totals
-            total_kanal = df['Kanal'].sum()
-            total_marla = df['Marla'].sum()
+            df = process_data(df, include_sarshai)
+            # Raw totals: sum the two int32 columns as Python ints; the grand
+            # Sarshai total is derived from these rather than a pass over Total_Sarshai
+            if raw_totals is None:
+                total_kanal = int(df['Kanal'].sum())
+                total_marla = int(df['Marla'].sum())
+            else:
+                total_kanal, total_marla = raw_totals
             # Converted totals
             kila, kanal, marla, sarshai = convert_totals(total_kanal, total_marla)
         
@@ -92,25 +221,25 @@ def main():
         with tab1:
             st.subheader("Processed Data")
             st.dataframe(df, use_container_width=True)
+            st.download_button(
+                "⬇️ Download CSV",
+                data=create_csv_file(df) if csv_data is None else csv_data,
+                file_name="jamabandi_processed.csv",
+                mime="text/csv",
+            )
         
         with tab2:
             st.subheader("Raw Totals")
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric("Total Kanal", f"{total_kanal:,}")
-            with col2:
-                st.metric("Total Marla", f"{total_marla:,}")
+            st.table(pd.DataFrame(
+                {"Total Kanal": [f"{total_kanal:,}"], "Total Marla": [f"{total_marla:,}"]},
+                index=["Total"],
+            ))
 
             st.subheader("Converted Totals")
-            col3, col4, col5, col6 = st.columns(4)
-            with col3:
-                st.metric("Kila", f"{kila:,}")
-            with col4:
-                st.metric("Kanal", f"{kanal:,}")
-            with col5:
-                st.metric("Marla", f"{marla:,}")
-            with col6:
-                st.metric("Sarshai", f"{sarshai:,}")
+            st.table(pd.DataFrame(
+                {"Kila": [f"{kila:,}"], "Kanal": [f"{kanal:,}"], "Marla": [f"{marla:,}"], "Sarshai": [f"{sarshai:,}"]},
+                index=["Total"],
+            ))
 
             st.success(f"**Total Area:** {kila} Kila, {kanal} Kanal, {marla} Marla, {sarshai} Sarshai")
 
@@ -0,0 +1,32 @@
+import numpy as np
+
+try:
+    from numba import vectorize
+except ImportError:  # numba is optional; plain NumPy is used without it
+    vectorize = None
+
+# Conversion constants
+MARLA_PER_SARSHAI = 9
+KANAL_PER_MARLA = 20
+KILA_PER_KANAL = 8
+
+# Folded Sarshai multipliers/divisors
+SARSHAI_PER_KANAL = KANAL_PER_MARLA * MARLA_PER_SARSHAI
+SARSHAI_PER_MARLA = MARLA_PER_SARSHAI
+
+# Kept out of app.py: Streamlit re-executes the entry script on every rerun, while an
+# imported module (and the ufunc compiled here) is built once per server process
+if vectorize is not None:
+    @vectorize(['int64(int32, int32)', 'int64(int64, int64)'], target='parallel', cache=True)
+    def kanal_marla_to_sarshai(kanal, marla):
+        """Fused per-row Kanal & Marla to Sarshai kernel"""
+        return kanal * SARSHAI_PER_KANAL + marla * SARSHAI_PER_MARLA
+else:
+    def kanal_marla_to_sarshai(kanal, marla):
+        """Per-row Kanal & Marla to Sarshai using NumPy column arithmetic"""
+        # Accumulate into one preallocated int64 buffer; the int32 inputs are widened
+        # inside the ufunc loops rather than copied up front
+        out = np.empty(kanal.shape, dtype=np.int64)
+        np.multiply(kanal, SARSHAI_PER_KANAL, out=out, dtype=np.int64)
+        np.add(out, np.multiply(marla, SARSHAI_PER_MARLA, dtype=np.int64), out=out)
+        return out